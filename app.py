@@ -3,18 +3,347 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import io
+import uuid
 from datetime import datetime
 
+from chart_data import PercentileBands, current_projection_cubes, downsample_minmax
+from cube_export import (
+    EXPORT_CHUNK_ROWS, EXPORT_ROOT, build_projection_cube, cube_export_rows, resolve_export_dir,
+    write_projection_ipc, write_projection_parquet
+)
+from history import InputHistory
+from jobs import Job, JobLimitError, JobRunner
+
 st.set_page_config(page_title="Financial Model", layout="wide")
 
+# Seconds between background job progress updates in the sidebar
+JOB_POLL_SECONDS = 1.0
+
+# Excel exports with at least this many cells run as background jobs
+EXCEL_JOB_MIN_CELLS = 1_000_000
+
+
+# --- Input edit history (undo/redo) ---
+def snapshot_inputs() -> dict[str, pd.DataFrame]:
+    assumptions = {
+        (name, scenario): values
+        for name, by_scenario in st.session_state["assumptions"].items()
+        for scenario, values in by_scenario.items()
+    }
+    assumptions_df = pd.DataFrame.from_dict(assumptions, orient="index")
+    assumptions_df.columns = [f"Year {i + 1}" for i in range(assumptions_df.shape[1])]
+
+    snapshot = {
+        "Historical Data": st.session_state["historical_data"].copy(),
+        "Balance Sheet": st.session_state["balance_sheet_inputs"].copy(),
+        "Assumptions": assumptions_df,
+    }
+    for key, df in st.session_state["da_inputs"].items():
+        snapshot[f"D&A / {key}"] = df.copy()
+    for key, df in st.session_state["debt_inputs"].items():
+        snapshot[f"Debt / {key}"] = df.copy()
+    return snapshot
+
+
+def restore_inputs(snapshot: dict[str, pd.DataFrame]) -> None:
+    st.session_state["historical_data"] = snapshot["Historical Data"].copy()
+    st.session_state["balance_sheet_inputs"] = snapshot["Balance Sheet"].copy()
+    # Drop pending editor edits so they are not re-applied on top of the restored data
+    st.session_state.pop("bs_editor", None)
+
+    for key in st.session_state["da_inputs"]:
+        st.session_state["da_inputs"][key] = snapshot[f"D&A / {key}"].copy()
+    for key in st.session_state["debt_inputs"]:
+        st.session_state["debt_inputs"][key] = snapshot[f"Debt / {key}"].copy()
+
+    # Assumptions are restored into their store; widgets of open expanders are dropped
+    # so the next run rebuilds them from the restored values
+    assumptions_df = snapshot["Assumptions"]
+    st.session_state["years"] = assumptions_df.shape[1]
+    same_every_year = st.session_state.setdefault("assumptions_same", {})
+    for (name, scenario), values in assumptions_df.iterrows():
+        values = [float(v) for v in values]
+        st.session_state["assumptions"].setdefault(name, {})[scenario] = values
+        same_every_year[(name, scenario)] = len(set(values)) == 1
+        widget_keys = [
+            key for key in st.session_state
+            if key == f"same_{name}_{scenario}" or key.startswith(f"{name}_{scenario}_")
+        ]
+        for key in widget_keys:
+            del st.session_state[key]
+
+
+def jump_to_revision() -> None:
+    history = st.session_state["input_history"]
+    restore_inputs(history.jump(st.session_state["history_revision"]))
+
+
+def step_history(step: int) -> None:
+    history = st.session_state["input_history"]
+    restore_inputs(history.undo() if step < 0 else history.redo())
+
+
+# --- Chart data (prepared server-side) ---
+def stack_projection_cubes(cubes: dict[str, dict]) -> dict:
+    # One (scenario x line item x period) array shared by every overlay; rebuilt only
+    # when a scenario's projection changes. All cubes must come from the same revision.
+    key = tuple((scenario, cube["key"]) for scenario, cube in cubes.items())
+    cached = st.session_state.get("chart_cube")
+    if cached is not None and cached["key"] == key:
+        return cached
+
+    first = next(iter(cubes.values()))
+    chart_cube = {
+        "key": key,
+        "scenarios": list(cubes),
+        "line_items": first["line_items"],
+        "years": first["years"],
+        "values": np.stack([cube["values"] for cube in cubes.values()]),
+    }
+    st.session_state["chart_cube"] = chart_cube
+    return chart_cube
+
+
+def simulation_bands(scenario: str, paths: np.ndarray, item: int, revision: str,
+                     chunk_rows: int = EXPORT_CHUNK_ROWS) -> dict[str, np.ndarray]:
+    # Progress is tracked per scenario and input revision as a path count, so chunks
+    # appended to the simulation (even as a new array) only feed the paths not seen yet
+    states = st.session_state.setdefault("percentile_bands", {})
+    state = states.get((scenario, item))
+    if state is None or state["revision"] != revision or state["consumed"] > len(paths):
+        state = {"revision": revision, "consumed": 0, "bands": PercentileBands()}
+        states[(scenario, item)] = state
+    step = max(1, chunk_rows // max(1, paths.shape[-1]))
+    while state["consumed"] < len(paths):
+        stop = min(state["consumed"] + step, len(paths))
+        state["bands"].update(paths[state["consumed"]:stop, item, :])
+        state["consumed"] = stop
+    return state["bands"].bands()
+
+
+def line_chart(df: pd.DataFrame) -> None:
+    # One line per column against the index. A plain Vega-Lite spec avoids st.line_chart,
+    # which imports Altair and validates the chart schema on every rerun.
+    x = df.index.name or "index"
+    data = df.reset_index().melt(x, var_name="Series", value_name="Value")
+    st.vega_lite_chart(data, {
+        "mark": {"type": "line", "tooltip": True},
+        "encoding": {
+            "x": {"field": x, "type": "quantitative", "axis": {"format": "d"}, "scale": {"zero": False}},
+            "y": {"field": "Value", "type": "quantitative"},
+            "color": {"field": "Series", "type": "nominal", "title": None},
+        },
+    }, width="stretch")
+
+
+# --- Background jobs ---
+@st.cache_resource
+def job_runner() -> JobRunner:
+    return JobRunner()
+
+
+def job_client_key() -> str:
+    # Per-user limits follow the signed-in account, otherwise the ?sid= session. The IP is
+    # not used since users behind one proxy or port forward share it; tabs opened to get
+    # around the limit are bounded by JOB_QUEUE_LIMIT instead
+    email = st.user.get("email")
+    if email:
+        return f"user:{email}"
+    return f"session:{st.session_state['job_owner']}"
+
+
+def submit_job(label: str, fn, *args, download: tuple | None = None) -> Job | None:
+    try:
+        job = job_runner().submit(
+            st.session_state["job_owner"], job_client_key(), label, fn, *args, download=download
+        )
+    except JobLimitError as exc:
+        st.warning(str(exc))
+        return None
+    st.info(f"{label} is running in the background; follow its progress under Background Jobs in the sidebar.")
+    return job
+
+
+def render_jobs(owner: str, polling: bool) -> None:
+    runner = job_runner()
+    jobs = runner.jobs_for(owner)
+    if not jobs:
+        st.caption("No background jobs.")
+    for job in jobs:
+        st.markdown(f"**{job.label}** · {job.status}")
+        if job.active:
+            st.progress(job.progress, text=job.message or None)
+            st.button("Cancel", key=f"cancel_{job.id}", on_click=runner.cancel, args=(owner, job.id))
+            if job.partial is not None:
+                st.caption(str(job.partial))
+        elif job.status == "done" and job.download is not None:
+            file_name, mime = job.download
+            st.download_button(
+                "Download", data=read_job_file(job.result), file_name=file_name, mime=mime, key=f"download_{job.id}"
+            )
+        elif job.status == "done" and job.result is not None:
+            st.caption(str(job.result))
+        elif job.status == "failed":
+            st.error(job.error)
+
+    # Once the last job finishes, rerun the whole page so polling stops
+    if polling and not any(job.active for job in jobs):
+        st.rerun()
+
+
+def read_job_file(path: str):
+    # Deferred so the file is only read when the user actually clicks Download
+    def read() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    return read
+
+
+def write_projections_excel(target, df: pd.DataFrame) -> None:
+    with pd.ExcelWriter(target, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name="Projections", index=False)
+
+
+def excel_download(df: pd.DataFrame):
+    # Deferred so the workbook is only built when the user actually clicks Download
+    def build() -> bytes:
+        output = io.BytesIO()
+        write_projections_excel(output, df)
+        return output.getvalue()
+
+    return build
+
+
+def excel_export_job(job: Job, df: pd.DataFrame) -> str:
+    job.report(0.0, "Writing workbook")
+    output = job.temp_file(".xlsx")
+    write_projections_excel(output, df)
+    return output
+
+
+def parquet_export_job(job: Job, root: str, cubes: dict[str, dict], paths: dict[str, np.ndarray] | None) -> str:
+    written = write_projection_parquet(
+        root, cubes, paths,
+        on_batch=job.batch_progress(cube_export_rows(cubes, paths)),
+        on_scenario=job.scenario_progress(len(cubes))
+    )
+    return f"Wrote {len(written)} scenario partition(s) to {root}"
+
+
+def ipc_export_job(job: Job, cubes: dict[str, dict], paths: dict[str, np.ndarray] | None) -> str:
+    # Streamed batch by batch to a temporary file, never built up in memory
+    output = job.temp_file(".arrows")
+    with open(output, "wb") as sink:
+        write_projection_ipc(
+            sink, cubes, paths,
+            on_batch=job.batch_progress(cube_export_rows(cubes, paths)),
+            on_scenario=job.scenario_progress(len(cubes))
+        )
+    return output
+
+
+# --- Default model ---
+# Defaults are built once per process and shared; st.cache_data hands every
+# session its own copy, so in-place edits never leak between sessions.
+@st.cache_data
+def default_historical_data(current_year: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Year": [current_year - i for i in reversed(range(3))],
+        "Ingresos": [100000, 120000, 140000],
+        "Costo de Ventas": [40000, 48000, 56000],
+        "Gastos Administración": [15000, 16000, 17000],
+        "Gastos Ventas": [15000, 16000, 17000],
+        "Depreciación": [5000, 6000, 7000],
+        "Amortización": [2000, 2500, 3000],
+        "Otros Ingresos No Operativos": [1000, 1100, 1200],
+        "Otros Gastos No Operativos": [500, 600, 700],
+        "Resultado Financiero Neto": [1000, 1200, 1500],
+        "Participación de Trabajadores": [2000, 2200, 2500],
+        "Impuestos": [5000, 5500, 6000]
+    })
+
+
+@st.cache_data
+def default_balance_sheet(historical_years: tuple) -> pd.DataFrame:
+    num_years = len(historical_years)
+    return pd.DataFrame({
+        "Year": list(historical_years),
+        "Cash": [10000.0] * num_years,
+        "Accounts Receivable": [8000.0] * num_years,
+        "Inventory": [7000.0] * num_years,
+        "Other Current Assets": [3000.0] * num_years,
+        "Net PPE": [25000.0] * num_years,
+        "Net Intangibles": [5000.0] * num_years,
+        "Other Non-Current Assets": [2000.0] * num_years,
+        "Accounts Payable": [6000.0] * num_years,
+        "Short-Term Debt": [4000.0] * num_years,
+        "Other Current Liabilities": [3000.0] * num_years,
+        "Long-Term Debt": [10000.0] * num_years,
+        "Other Non-Current Liabilities": [2000.0] * num_years,
+        "Retained Earnings": [8000.0] * num_years,
+        "Other Equity": [5000.0] * num_years
+    })
+
+
+@st.cache_data
+def default_da_inputs(current_year: int, years: int) -> dict[str, pd.DataFrame]:
+    return {
+        "Fixed Assets": pd.DataFrame({
+            "Category": ["Machinery", "Furniture"],
+            "Historical Cost": [50000, 20000],
+            "Useful Life (Years)": [5, 10]
+        }),
+        "Intangibles": pd.DataFrame({
+            "Category": ["Software"],
+            "Historical Cost": [10000],
+            "Useful Life (Years)": [5]
+        }),
+        "CapEx Forecast": pd.DataFrame({
+            "Year": [current_year + i for i in range(years)],
+            "CapEx": [10000 for _ in range(years)]
+        })
+    }
+
+
+@st.cache_data
+def default_debt_inputs(current_year: int, years: int) -> dict[str, pd.DataFrame]:
+    return {
+        "Existing Debt": pd.DataFrame({
+            "Type": ["Short-Term", "Long-Term"],
+            "Beginning Balance": [10000, 50000],
+            "Interest Rate (%)": [5.0, 6.0],
+            "Term (Years)": [1, 5]
+        }),
+        "New Debt Assumptions": pd.DataFrame({
+            "Year": [current_year + i for i in range(years)],
+            "Amount": [0 for _ in range(years)],
+            "Interest Rate (%)": [7.0 for _ in range(years)],
+            "Term (Years)": [3 for _ in range(years)]
+        })
+    }
+
+
+@st.cache_resource
+def shared_default_projections() -> dict:
+    # Projection results for the untouched default model, reused by new sessions
+    return {}
+
+
 # Initialize session state
 if "years" not in st.session_state:
     st.session_state["years"] = 5
 
+# Background jobs belong to an id kept in the URL so they are picked up again after a reload
+if "sid" not in st.query_params:
+    st.query_params["sid"] = uuid.uuid4().hex
+st.session_state["job_owner"] = st.query_params["sid"]
+
 
 # Sidebar controls
 st.sidebar.header("Settings")
-st.session_state["years"] = st.sidebar.slider("Projection Duration (Years)", 1, 10, st.session_state["years"])
+# Keyed so undo/redo can restore the projection length through st.session_state["years"]
+st.sidebar.slider("Projection Duration (Years)", 1, 10, key="years")
 
 
 # Define tabs
@@ -34,21 +363,7 @@ with tabs[0]:
     ]
 
     if "historical_data" not in st.session_state or st.session_state["historical_data"].empty:
-        current_year = datetime.now().year
-        st.session_state["historical_data"] = pd.DataFrame({
-            "Year": [current_year - i for i in reversed(range(3))],
-            "Ingresos": [100000, 120000, 140000],
-            "Costo de Ventas": [40000, 48000, 56000],
-            "Gastos Administración": [15000, 16000, 17000],
-            "Gastos Ventas": [15000, 16000, 17000],
-            "Depreciación": [5000, 6000, 7000],
-            "Amortización": [2000, 2500, 3000],
-            "Otros Ingresos No Operativos": [1000, 1100, 1200],
-            "Otros Gastos No Operativos": [500, 600, 700],
-            "Resultado Financiero Neto": [1000, 1200, 1500],
-            "Participación de Trabajadores": [2000, 2200, 2500],
-            "Impuestos": [5000, 5500, 6000]
-        })
+        st.session_state["historical_data"] = default_historical_data(datetime.now().year)
 
     df_inputs = st.data_editor(
         st.session_state["historical_data"][["Year"] + input_cols].set_index("Year"),
@@ -114,23 +429,7 @@ with tabs[0]:
     ]
 
     if "balance_sheet_inputs" not in st.session_state or st.session_state["balance_sheet_inputs"].empty:
-        st.session_state["balance_sheet_inputs"] = pd.DataFrame({
-            "Year": historical_years,
-            "Cash": [10000.0] * num_years,
-            "Accounts Receivable": [8000.0] * num_years,
-            "Inventory": [7000.0] * num_years,
-            "Other Current Assets": [3000.0] * num_years,
-            "Net PPE": [25000.0] * num_years,
-            "Net Intangibles": [5000.0] * num_years,
-            "Other Non-Current Assets": [2000.0] * num_years,
-            "Accounts Payable": [6000.0] * num_years,
-            "Short-Term Debt": [4000.0] * num_years,
-            "Other Current Liabilities": [3000.0] * num_years,
-            "Long-Term Debt": [10000.0] * num_years,
-            "Other Non-Current Liabilities": [2000.0] * num_years,
-            "Retained Earnings": [8000.0] * num_years,
-            "Other Equity": [5000.0] * num_years
-        })
+        st.session_state["balance_sheet_inputs"] = default_balance_sheet(tuple(historical_years))
 
     bs_df = st.data_editor(
         st.session_state["balance_sheet_inputs"].set_index("Year"),
@@ -157,7 +456,13 @@ with tabs[0]:
         return df
 
     balance_sheet = generate_historical_balance_sheet(st.session_state["balance_sheet_inputs"])
-    st.dataframe(balance_sheet.set_index("Year").style.format("{:,.0f}"), use_container_width=True)
+    # Thousands formatting through column_config rather than a pandas Styler, which is
+    # slow to import and render
+    number_format = st.column_config.NumberColumn(format="%,.0f")
+    st.dataframe(
+        balance_sheet.set_index("Year"), use_container_width=True,
+        column_config={col: number_format for col in balance_sheet.columns if col != "Year"}
+    )
 
 
 # --- Tab 2: Assumptions ---
@@ -193,19 +498,30 @@ with tabs[1]:
 
     if "assumptions" not in st.session_state:
         st.session_state["assumptions"] = {}
+    # "Same every year" flags per (assumption, scenario), kept while their checkbox is not built
+    same_every_year = st.session_state.setdefault("assumptions_same", {})
 
+    # Values live in st.session_state["assumptions"]; widgets are only built inside the
+    # expanders that are open, so collapsed assumptions add no widgets to a rerun
     for name in assumption_names:
         if name not in st.session_state["assumptions"]:
             st.session_state["assumptions"][name] = {}
 
-        with st.expander(name):
+        expander = st.expander(name, key=f"expander_{name}", on_change="rerun")
+        with expander:
             for scenario in scenarios:
-                same = st.checkbox(f"Same every year ({scenario})", value=True, key=f"same_{name}_{scenario}")
+                stored = st.session_state["assumptions"][name].get(scenario, [])
+                same = same_every_year.get((name, scenario), True)
+                if expander.open:
+                    same = st.checkbox(f"Same every year ({scenario})", value=same, key=f"same_{name}_{scenario}")
+                    same_every_year[(name, scenario)] = same
                 values = []
                 for year in range(1, st.session_state["years"] + 1):
                     key = f"{name}_{scenario}_{year}"
                     if year == 1 or not same:
-                        val = st.number_input(f"{scenario} - Year {year}", value=10.0, step=1.0, key=key)
+                        val = stored[year - 1] if year <= len(stored) else 10.0
+                        if expander.open:
+                            val = st.number_input(f"{scenario} - Year {year}", value=val, step=1.0, key=key)
                     else:
                         val = values[0]
                     values.append(val)
@@ -216,22 +532,7 @@ with tabs[2]:
     st.subheader("Depreciation & Amortization Inputs")
 
     if "da_inputs" not in st.session_state:
-        st.session_state["da_inputs"] = {
-            "Fixed Assets": pd.DataFrame({
-                "Category": ["Machinery", "Furniture"],
-                "Historical Cost": [50000, 20000],
-                "Useful Life (Years)": [5, 10]
-            }),
-            "Intangibles": pd.DataFrame({
-                "Category": ["Software"],
-                "Historical Cost": [10000],
-                "Useful Life (Years)": [5]
-            }),
-            "CapEx Forecast": pd.DataFrame({
-                "Year": [datetime.now().year + i for i in range(st.session_state["years"])],
-                "CapEx": [10000 for _ in range(st.session_state["years"])]
-            })
-        }
+        st.session_state["da_inputs"] = default_da_inputs(datetime.now().year, st.session_state["years"])
 
     st.markdown("### Fixed Assets")
     st.session_state["da_inputs"]["Fixed Assets"] = st.data_editor(
@@ -253,21 +554,7 @@ with tabs[3]:
     st.subheader("Debt Structure")
 
     if "debt_inputs" not in st.session_state:
-        current_year = datetime.now().year
-        st.session_state["debt_inputs"] = {
-            "Existing Debt": pd.DataFrame({
-                "Type": ["Short-Term", "Long-Term"],
-                "Beginning Balance": [10000, 50000],
-                "Interest Rate (%)": [5.0, 6.0],
-                "Term (Years)": [1, 5]
-            }),
-            "New Debt Assumptions": pd.DataFrame({
-                "Year": [current_year + i for i in range(st.session_state["years"])],
-                "Amount": [0 for _ in range(st.session_state["years"])],
-                "Interest Rate (%)": [7.0 for _ in range(st.session_state["years"])],
-                "Term (Years)": [3 for _ in range(st.session_state["years"])]
-            })
-        }
+        st.session_state["debt_inputs"] = default_debt_inputs(datetime.now().year, st.session_state["years"])
     
     new_debt = st.data_editor(
         st.session_state["debt_inputs"]["New Debt Assumptions"],
@@ -287,7 +574,35 @@ with tabs[3]:
     )
 
     st.markdown("### New Debt Assumptions")
-    
+
+
+# Record this run's inputs as a new revision if anything was edited
+if "input_history" not in st.session_state:
+    st.session_state["input_history"] = InputHistory(snapshot_inputs())
+else:
+    st.session_state["input_history"].record(snapshot_inputs())
+history = st.session_state["input_history"]
+
+st.sidebar.header("Edit History")
+undo_col, redo_col = st.sidebar.columns(2)
+undo_col.button("Undo", on_click=step_history, args=(-1,), disabled=not history.can_undo(), use_container_width=True)
+redo_col.button("Redo", on_click=step_history, args=(1,), disabled=not history.can_redo(), use_container_width=True)
+
+revision_labels = {rev["id"]: f"#{rev['id']} {rev['time']} – {rev['label']}" for rev in history.revisions}
+st.session_state["history_revision"] = history.current_revision["id"]
+st.sidebar.selectbox(
+    "Revision",
+    list(reversed(revision_labels)),
+    format_func=revision_labels.get,
+    key="history_revision",
+    on_change=jump_to_revision
+)
+
+# Projection results cached per input revision; only revisions still in history are kept
+projection_cache = st.session_state.setdefault("projection_cache", {})
+live_digests = {rev["digest"] for rev in history.revisions}
+for cache_key in [k for k in projection_cache if k[0] not in live_digests]:
+    del projection_cache[cache_key]
 
 # Other tabs (Projections, Charts, Valuation) stay the same for now
 
@@ -300,19 +615,11 @@ with tabs[4]:
 
     # Selección de escenario
     scenario = st.selectbox("Select scenario", ["Base", "Optimistic", "Worst"])
-    assumptions = {}
-    for name in st.session_state["assumptions"]:
-        assumptions[name] = st.session_state["assumptions"][name][scenario]
 
     # Subtabs: Income Statement, Cash Flow, Balance Sheet
     subtab_labels = ["Estado de Resultados", "Flujo de Caja", "Balance General"]
     subtab_objs = st.tabs(subtab_labels)
 
-    # Inicialización de estructuras de datos
-    income_statement = []
-    cash_flow = []
-    balance_sheet = []
-
     historical_data = st.session_state.get("historical_data", pd.DataFrame())
 
     historical_years = historical_data["Year"].tolist()
@@ -332,26 +639,6 @@ with tabs[4]:
 
     bs_row = bs_row.iloc[0]
 
-    # Initialize prior-year positions first
-    prev_cash = float(bs_row["Cash"])
-    prev_assets = float(bs_row["Total Assets"])
-    prev_equity = float(bs_row["Total Equity"])
-    prev_debt = float(bs_row["Short-Term Debt"] + bs_row["Long-Term Debt"])
-
-    # Derive static components directly from bs_row to avoid ordering issues
-    prev_ppe = float(bs_row["Net PPE"])
-    other_assets_static = float(bs_row["Total Assets"] - bs_row["Cash"] - bs_row["Net PPE"])
-    prev_total_liabilities = float(bs_row["Total Liabilities"])
-    other_liabilities_static = float(prev_total_liabilities - prev_debt)
-
-    # Revenue/COGS baseline and starting WC
-    prev_revenue = float(historical_data.loc[historical_data["Year"] == start_year, "Ingresos"].iloc[0])
-    prev_cogs = float(historical_data.loc[historical_data["Year"] == start_year, "Costo de Ventas"].iloc[0])
-    prev_ar = prev_revenue * assumptions["Days Receivables"][0] / 365.0
-    prev_inv = prev_cogs * assumptions["Days Inventory"][0] / 365.0
-    prev_ap = prev_cogs * assumptions["Days Payables"][0] / 365.0
-
-
     def calculate_debt_schedule(debt_inputs, projection_years):
         existing_df = debt_inputs["Existing Debt"].copy()
         new_df = debt_inputs["New Debt Assumptions"].copy()
@@ -458,118 +745,164 @@ with tabs[4]:
 
         return {"da": da_by_year, "capex": capex_by_year}
 
-    debt_inputs = st.session_state["debt_inputs"]
-    da_inputs = st.session_state["da_inputs"]
-    debt_data = calculate_debt_schedule(debt_inputs, projection_years)
-    d_and_a_data = calculate_da_schedule(da_inputs, projection_years)
-
-    projected_income_statements = {}
-    projected_cash_flows = {}
-
-    for year in projection_years:
-        # --- Estado de Resultados ---
-        year_index = year - projection_years[0]
-        growth_rate = assumptions["Revenue Growth (%)"][year_index] / 100.0
-        revenue = prev_revenue * (1.0 + growth_rate)
-        cogs_pct = assumptions["COGS (% of Revenue)"][year_index]
-        cogs = revenue * cogs_pct / 100.0
-        admin_exp_pct = assumptions["Admin Expenses (% of Revenue)"][year_index]
-        admin_expenses = revenue * admin_exp_pct / 100
-        sale_exp_pct = assumptions["Sales Expenses (% of Revenue)"][year_index]
-        sales_expenses = revenue * sale_exp_pct / 100
-        other_inc_pct =  assumptions["Other Income (% of Revenue)"][year_index]
-        other_income = revenue * other_inc_pct/ 100
+    def project_scenario(scenario: str) -> tuple:
+        # Income statement, cash flow, balance sheet and cube for one scenario at the
+        # current input revision; results are cached per revision
+        assumptions = {}
+        for name in st.session_state["assumptions"]:
+            assumptions[name] = st.session_state["assumptions"][name][scenario]
+
+        income_statement = []
+        cash_flow = []
+        balance_sheet = []
+
+        # Initialize prior-year positions first
+        prev_cash = float(bs_row["Cash"])
+        prev_assets = float(bs_row["Total Assets"])
+        prev_equity = float(bs_row["Total Equity"])
+        prev_debt = float(bs_row["Short-Term Debt"] + bs_row["Long-Term Debt"])
+
+        # Derive static components directly from bs_row to avoid ordering issues
+        prev_ppe = float(bs_row["Net PPE"])
+        other_assets_static = float(bs_row["Total Assets"] - bs_row["Cash"] - bs_row["Net PPE"])
+        prev_total_liabilities = float(bs_row["Total Liabilities"])
+        other_liabilities_static = float(prev_total_liabilities - prev_debt)
+
+        # Revenue/COGS baseline and starting WC
+        prev_revenue = float(historical_data.loc[historical_data["Year"] == start_year, "Ingresos"].iloc[0])
+        prev_cogs = float(historical_data.loc[historical_data["Year"] == start_year, "Costo de Ventas"].iloc[0])
+        prev_ar = prev_revenue * assumptions["Days Receivables"][0] / 365.0
+        prev_inv = prev_cogs * assumptions["Days Inventory"][0] / 365.0
+        prev_ap = prev_cogs * assumptions["Days Payables"][0] / 365.0
+
+        cache_key = (history.current_revision["digest"], scenario, st.session_state["years"])
+        default_projections = shared_default_projections()
+        cached = projection_cache.get(cache_key) or default_projections.get(cache_key)
+        if cached is not None:
+            income_statement, cash_flow, balance_sheet, cube = cached
+        else:
+            debt_inputs = st.session_state["debt_inputs"]
+            da_inputs = st.session_state["da_inputs"]
+            debt_data = calculate_debt_schedule(debt_inputs, projection_years)
+            d_and_a_data = calculate_da_schedule(da_inputs, projection_years)
+
+            projected_income_statements = {}
+            projected_cash_flows = {}
+
+            for year in projection_years:
+                # --- Estado de Resultados ---
+                year_index = year - projection_years[0]
+                growth_rate = assumptions["Revenue Growth (%)"][year_index] / 100.0
+                revenue = prev_revenue * (1.0 + growth_rate)
+                cogs_pct = assumptions["COGS (% of Revenue)"][year_index]
+                cogs = revenue * cogs_pct / 100.0
+                admin_exp_pct = assumptions["Admin Expenses (% of Revenue)"][year_index]
+                admin_expenses = revenue * admin_exp_pct / 100
+                sale_exp_pct = assumptions["Sales Expenses (% of Revenue)"][year_index]
+                sales_expenses = revenue * sale_exp_pct / 100
+                other_inc_pct =  assumptions["Other Income (% of Revenue)"][year_index]
+                other_income = revenue * other_inc_pct/ 100
         
 
-        # Depreciación y Amortización
-        d_a = d_and_a_data["da"].get(year, 0.0)
-        capex = d_and_a_data["capex"].get(year, 0.0)
-
-        # EBIT
-        ebit = revenue - cogs - admin_expenses - sales_expenses + other_income - d_a
-
-        # Intereses
-        interest_expense = debt_data.get("interest_expense", {}).get(year, 0.0)
-        interest_rate = assumptions["Interest Rate Earned on Cash (%)"][year_index]
-        interest_income = prev_cash * interest_rate / 100.0
-
-        days_rec = assumptions["Days Receivables"][year_index]
-        days_inv = assumptions["Days Inventory"][year_index]
-        days_pay = assumptions["Days Payables"][year_index]
-
-        ar = revenue * days_rec / 365.0
-        inv = cogs * days_inv / 365.0
-        ap = cogs * days_pay / 365.0
-        change_in_wcap = (ar - prev_ar) + (inv - prev_inv) - (ap - prev_ap)
-
-        ebt = ebit - interest_expense + interest_income
-
-        # Impuesto (ajustado por participación de trabajadores)
-        workers_participation = 0.15 * ebt if ebt > 0 else 0
-        taxable_income = ebt - workers_participation
-        tax_rate = assumptions["Tax Rate (%)"][year_index]
-        taxes = taxable_income * tax_rate / 100 if taxable_income > 0 else 0
-
-        net_income = ebt - taxes
-
-        income_statement.append({
-            "Year": year,
-            "Ingresos": revenue,
-            "COGS": cogs,
-            "Admin Expenses": admin_expenses,
-            "Sales Expenses": sales_expenses,
-            "Other Income": other_income,
-            "D&A": d_a,
-            "EBIT": ebit,
-            "Interest Expense": interest_expense,
-            "Interest Income": interest_income,
-            "EBT": ebt,
-            "Taxes": taxes,
-            "Net Income": net_income
-        })
-
-        # --- Flujo de Caja ---
-        operating_cf = net_income + d_a - change_in_wcap
-        investing_cf = -capex
-        principal_payment = debt_data.get("principal_payment", {}).get(year, 0.0)
-        new_debt_year = debt_data.get("new_debt", {}).get(year, 0.0)
-        financing_cf = -principal_payment + new_debt_year
-
-        net_cash_flow = operating_cf + investing_cf + financing_cf
-        ending_cash = prev_cash + net_cash_flow
-
-        cash_flow.append({
-            "Year": year,
-            "Operating CF": operating_cf,
-            "Investing CF": investing_cf,
-            "Financing CF": financing_cf,
-            "Net Cash Flow": net_cash_flow,
-            "Ending Cash": ending_cash
-        })
-
-        # --- Balance General ---
-        ppe = prev_ppe + capex - d_a
-        total_assets = ending_cash + ppe + other_assets_static
-        total_liabilities = other_liabilities_static + debt_data.get("ending_balance", {}).get(year, prev_debt)
-        equity = total_assets - total_liabilities
-
-        balance_sheet.append({
-            "Year": year,
-            "Cash": ending_cash,
-            "Total Assets": total_assets,
-            "Debt": total_liabilities,
-            "Equity": equity
-        })
-
-        # Actualizar para el siguiente año
-        prev_cash = ending_cash
-        prev_assets = total_assets
-        prev_debt = total_liabilities - other_liabilities_static
-        prev_equity = equity
-        prev_ppe = ppe
-        prev_revenue = revenue
-        prev_cogs = cogs
-        prev_ar, prev_inv, prev_ap = ar, inv, ap
+                # Depreciación y Amortización
+                d_a = d_and_a_data["da"].get(year, 0.0)
+                capex = d_and_a_data["capex"].get(year, 0.0)
+
+                # EBIT
+                ebit = revenue - cogs - admin_expenses - sales_expenses + other_income - d_a
+
+                # Intereses
+                interest_expense = debt_data.get("interest_expense", {}).get(year, 0.0)
+                interest_rate = assumptions["Interest Rate Earned on Cash (%)"][year_index]
+                interest_income = prev_cash * interest_rate / 100.0
+
+                days_rec = assumptions["Days Receivables"][year_index]
+                days_inv = assumptions["Days Inventory"][year_index]
+                days_pay = assumptions["Days Payables"][year_index]
+
+                ar = revenue * days_rec / 365.0
+                inv = cogs * days_inv / 365.0
+                ap = cogs * days_pay / 365.0
+                change_in_wcap = (ar - prev_ar) + (inv - prev_inv) - (ap - prev_ap)
+
+                ebt = ebit - interest_expense + interest_income
+
+                # Impuesto (ajustado por participación de trabajadores)
+                workers_participation = 0.15 * ebt if ebt > 0 else 0
+                taxable_income = ebt - workers_participation
+                tax_rate = assumptions["Tax Rate (%)"][year_index]
+                taxes = taxable_income * tax_rate / 100 if taxable_income > 0 else 0
+
+                net_income = ebt - taxes
+
+                income_statement.append({
+                    "Year": year,
+                    "Ingresos": revenue,
+                    "COGS": cogs,
+                    "Admin Expenses": admin_expenses,
+                    "Sales Expenses": sales_expenses,
+                    "Other Income": other_income,
+                    "D&A": d_a,
+                    "EBIT": ebit,
+                    "Interest Expense": interest_expense,
+                    "Interest Income": interest_income,
+                    "EBT": ebt,
+                    "Taxes": taxes,
+                    "Net Income": net_income
+                })
+
+                # --- Flujo de Caja ---
+                operating_cf = net_income + d_a - change_in_wcap
+                investing_cf = -capex
+                principal_payment = debt_data.get("principal_payment", {}).get(year, 0.0)
+                new_debt_year = debt_data.get("new_debt", {}).get(year, 0.0)
+                financing_cf = -principal_payment + new_debt_year
+
+                net_cash_flow = operating_cf + investing_cf + financing_cf
+                ending_cash = prev_cash + net_cash_flow
+
+                cash_flow.append({
+                    "Year": year,
+                    "Operating CF": operating_cf,
+                    "Investing CF": investing_cf,
+                    "Financing CF": financing_cf,
+                    "Net Cash Flow": net_cash_flow,
+                    "Ending Cash": ending_cash
+                })
+
+                # --- Balance General ---
+                ppe = prev_ppe + capex - d_a
+                total_assets = ending_cash + ppe + other_assets_static
+                total_liabilities = other_liabilities_static + debt_data.get("ending_balance", {}).get(year, prev_debt)
+                equity = total_assets - total_liabilities
+
+                balance_sheet.append({
+                    "Year": year,
+                    "Cash": ending_cash,
+                    "Total Assets": total_assets,
+                    "Debt": total_liabilities,
+                    "Equity": equity
+                })
+
+                # Actualizar para el siguiente año
+                prev_cash = ending_cash
+                prev_assets = total_assets
+                prev_debt = total_liabilities - other_liabilities_static
+                prev_equity = equity
+                prev_ppe = ppe
+                prev_revenue = revenue
+                prev_cogs = cogs
+                prev_ar, prev_inv, prev_ap = ar, inv, ap
+            cube = build_projection_cube([income_statement, cash_flow, balance_sheet])
+            cube["key"] = cache_key
+            projection_cache[cache_key] = (income_statement, cash_flow, balance_sheet, cube)
+            # Revision 0 is the untouched default model, identical for every new session
+            initial = history.revisions[0]
+            if initial["id"] == 0 and cache_key[0] == initial["digest"]:
+                default_projections[cache_key] = projection_cache[cache_key]
+        return income_statement, cash_flow, balance_sheet, cube
+
+    income_statement, cash_flow, balance_sheet, cube = project_scenario(scenario)
 
 
     def build_er_df(income_rows: list[dict]) -> pd.DataFrame:
@@ -708,6 +1041,8 @@ with tabs[4]:
 
     st.session_state.setdefault("projection_data", {})
     st.session_state["projection_data"][scenario] = proj_df
+    st.session_state.setdefault("projection_cubes", {})
+    st.session_state["projection_cubes"][scenario] = cube
 
     # Keep scenario DataFrame stored without clearing previous scenarios
 
@@ -728,12 +1063,42 @@ with tabs[4]:
 with tabs[5]:
     st.subheader("Charts")
     metric = st.selectbox("Select Metric", ["Ingresos", "EBIT", "Net Income", "FCF"])
+    line_item = {"FCF": "Net Cash Flow"}.get(metric, metric)
 
-    available = st.session_state.get("projection_data", {})
-    scen = st.selectbox("Scenario", list(available.keys()) or ["Base"])
-    if scen in available:
-        df_plot = available[scen]
-        st.line_chart(df_plot.set_index("Year")[[metric]])
+    revision = history.current_revision["digest"]
+    cubes, stale = current_projection_cubes(
+        st.session_state.get("projection_cubes", {}), revision, st.session_state["years"]
+    )
+    if stale:
+        st.info(
+            f"Not shown, computed for earlier inputs: {', '.join(stale)}. "
+            "Open them in the Projections tab to refresh."
+        )
+    selected = st.multiselect("Scenarios", list(cubes.keys()), default=list(cubes.keys())[:1])
+    if selected:
+        chart_cube = stack_projection_cubes(cubes)
+        item = chart_cube["line_items"].index(line_item)
+        rows = [chart_cube["scenarios"].index(s) for s in selected]
+        df_plot = pd.DataFrame(
+            chart_cube["values"][rows, item, :].T,
+            index=pd.Index(chart_cube["years"], name="Year"),
+            columns=selected
+        )
+        line_chart(downsample_minmax(df_plot))
+
+        # Input hook for simulated paths (scenario -> path x line item x period); nothing
+        # in the app fills it yet, so bands only show once a simulation provides paths
+        simulation_paths = st.session_state.get("simulation_paths") or {}
+        for scen in selected:
+            if scen not in simulation_paths:
+                continue
+            bands = simulation_bands(scen, simulation_paths[scen], item, revision)
+            if not bands:
+                continue
+            df_bands = pd.DataFrame(bands, index=df_plot.index)
+            df_bands[scen] = df_plot[scen]
+            st.markdown(f"#### {scen}: {metric} percentile bands ({len(simulation_paths[scen]):,} paths)")
+            line_chart(downsample_minmax(df_bands))
     else:
         st.warning("No projection data available. Please run the Projections tab.")
 
@@ -751,15 +1116,53 @@ with tabs[6]:
         valuation = float(np.nansum(discounted_fcf))
         st.metric("Valuation", f"${valuation:,.0f}")
 
-        if st.button("Download Projections to Excel"):
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                df.to_excel(writer, sheet_name="Projections", index=False)
+        excel_mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        if df.size < EXCEL_JOB_MIN_CELLS:
             st.download_button(
-                label="Download Excel File",
-                data=output.getvalue(),
-                file_name="financial_model.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                "Download Projections to Excel", data=excel_download(df.copy()),
+                file_name="financial_model.xlsx", mime=excel_mime
+            )
+        elif st.button("Download Projections to Excel"):
+            submit_job(
+                f"Excel export ({scen})", excel_export_job, df.copy(), download=("financial_model.xlsx", excel_mime)
+            )
+
+        # Full line item x period x scenario cube (plus simulated paths when present)
+        st.markdown("### Projection Cube Export")
+        simulation_paths = st.session_state.get("simulation_paths")
+        export_folder = st.text_input(
+            "Parquet export folder", value="projections",
+            help=f"Written under {EXPORT_ROOT}/<session id>/ on the server"
+        )
+        if st.button("Write Parquet Dataset"):
+            try:
+                export_dir = resolve_export_dir(st.session_state["job_owner"], export_folder)
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                # Every scenario at the current input revision, not just the ones opened so far
+                export_cubes = {s: project_scenario(s)[3] for s in scenarios}
+                # Jobs get their own dicts so later reruns can't change them after hashing
+                submit_job(
+                    "Parquet export", parquet_export_job, export_dir, export_cubes,
+                    dict(simulation_paths) if simulation_paths else None
+                )
+
+        if st.button("Download Projection Cube (Arrow IPC)"):
+            export_cubes = {s: project_scenario(s)[3] for s in scenarios}
+            submit_job(
+                "Arrow IPC export", ipc_export_job, export_cubes,
+                dict(simulation_paths) if simulation_paths else None,
+                download=("financial_model.arrows", "application/vnd.apache.arrow.stream")
             )
     else:
-        st.warning("No projection data available. Please complete the Projections tab first.")
\ No newline at end of file
+        st.warning("No projection data available. Please complete the Projections tab first.")
+
+# --- Background jobs panel ---
+# Rendered last so jobs submitted during this run show up immediately; the
+# fragment polls progress on its own without rerunning the whole page
+st.sidebar.header("Background Jobs")
+job_owner = st.session_state["job_owner"]
+polling = any(job.active for job in job_runner().jobs_for(job_owner))
+with st.sidebar:
+    st.fragment(render_jobs, run_every=JOB_POLL_SECONDS if polling else None)(job_owner, polling)
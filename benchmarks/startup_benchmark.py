@@ -0,0 +1,119 @@
+"""Cold-start benchmark for the financial model app.
+
+Every sample runs in a fresh Python process and reports:
+
+- first_render_s: importing Streamlit and running the script once for a new
+  session, i.e. everything a user waits for before the first page is complete
+  (this includes the default Base projection, since all tabs render in one pass).
+- first_projection_s: switching that session to a scenario that has not been
+  projected yet and rendering the result.
+- rerun_s: rerunning that session after an input change (the discount rate),
+  the cost every widget interaction pays.
+- warm_session_s: a second new session in the same process, which reuses the
+  shared default model and default projections.
+
+Medians are compared with the targets in baseline.json; the script exits with
+status 1 if any target is exceeded. The targets sit below the times of the app
+before the startup work ("reference" in baseline.json, measured with
+``--app`` on that tree), so a change that gives the gain back fails.
+
+    python benchmarks/startup_benchmark.py [--samples 5] [--update-baseline]
+    python benchmarks/startup_benchmark.py --app <old checkout>/app.py --update-reference
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+METRICS = ["first_render_s", "first_projection_s", "rerun_s", "warm_session_s"]
+
+
+def measure_once(app_path: str) -> dict:
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.run()
+    first_render = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    start = time.perf_counter()
+    next(s for s in at.selectbox if s.label == "Select scenario").set_value("Optimistic").run()
+    first_projection = time.perf_counter() - start
+
+    start = time.perf_counter()
+    next(n for n in at.number_input if n.label == "Discount Rate (%)").set_value(12.0).run()
+    rerun = time.perf_counter() - start
+
+    start = time.perf_counter()
+    AppTest.from_file(app_path, default_timeout=120).run()
+    warm_session = time.perf_counter() - start
+
+    return {
+        "first_render_s": first_render,
+        "first_projection_s": first_projection,
+        "rerun_s": rerun,
+        "warm_session_s": warm_session,
+    }
+
+
+def run_samples(samples: int, app_path: str) -> dict:
+    results = {metric: [] for metric in METRICS}
+    for _ in range(samples):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--app", app_path],
+            cwd=os.path.dirname(app_path), capture_output=True, text=True, check=True
+        )
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        for metric in METRICS:
+            results[metric].append(sample[metric])
+    return {metric: round(statistics.median(values), 3) for metric, values in results.items()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the measured medians in baseline.json (targets are kept)")
+    parser.add_argument("--update-reference", action="store_true",
+                        help="store the measured medians as the reference times in baseline.json")
+    parser.add_argument("--app", default=APP_PATH,
+                        help="app to measure, e.g. a checkout of an older revision (default: this tree)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app_path = os.path.abspath(args.app)
+
+    if args.child:
+        print(json.dumps(measure_once(app_path)))
+        return 0
+
+    measured = run_samples(args.samples, app_path)
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    failed = False
+    for metric in METRICS:
+        target = baseline["targets"][metric]
+        reference = baseline.get("reference", {}).get(metric)
+        status = "ok" if measured[metric] <= target else "SLOW"
+        failed |= status != "ok"
+        compared = f"  reference {reference:.3f}s" if reference is not None else ""
+        print(f"{metric:<20} {measured[metric]:>8.3f}s  target {target:.3f}s{compared}  {status}")
+
+    if args.update_baseline or args.update_reference:
+        baseline["reference" if args.update_reference else "measured"] = measured
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
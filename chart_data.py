@@ -0,0 +1,92 @@
+"""Chart payloads prepared server-side: percentile bands and downsampled series."""
+import numpy as np
+import pandas as pd
+
+# Chart payload limits: points per series and values kept per period for percentile bands
+CHART_MAX_POINTS = 500
+BAND_CAPACITY = 4096
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class PercentileBands:
+    """Streaming percentile bands per period over simulated paths.
+
+    Chunks of paths are pushed as they arrive. Each level keeps at most
+    ``capacity`` values per period, where a value at level ``i`` stands for
+    ``2 ** i`` paths; a full level is sorted and every other value is promoted
+    to the next level. Bands are exact until ``capacity`` paths have been seen.
+    """
+
+    def __init__(self, capacity: int = BAND_CAPACITY, percentiles: tuple = BAND_PERCENTILES):
+        self.capacity = capacity
+        self.percentiles = percentiles
+        self.levels = []
+        self.count = 0
+        self._offset = 0
+
+    def update(self, chunk: np.ndarray) -> None:
+        # chunk is shaped (path x period)
+        rows = np.asarray(chunk, dtype=np.float64)
+        self.count += len(rows)
+        level = 0
+        while len(rows):
+            if level == len(self.levels):
+                self.levels.append(rows)
+            else:
+                self.levels[level] = np.vstack([self.levels[level], rows])
+            buf = self.levels[level]
+            if len(buf) <= self.capacity:
+                return
+            buf = np.sort(buf, axis=0)
+            even = len(buf) - len(buf) % 2
+            self.levels[level] = buf[even:]
+            rows = buf[self._offset:even:2]
+            self._offset ^= 1
+            level += 1
+
+    def bands(self) -> dict[str, np.ndarray]:
+        # Empty until the first paths arrive
+        if self.count == 0:
+            return {}
+        values = np.vstack(self.levels)
+        weights = np.concatenate([np.full(len(rows), 2.0 ** i) for i, rows in enumerate(self.levels)])
+        order = np.argsort(values, axis=0)
+        sorted_values = np.take_along_axis(values, order, axis=0)
+        cum_weights = np.cumsum(weights[order], axis=0)
+        columns = np.arange(values.shape[1])
+        out = {}
+        for p in self.percentiles:
+            idx = (cum_weights < cum_weights[-1] * p / 100.0).sum(axis=0)
+            out[f"P{p}"] = sorted_values[np.minimum(idx, len(values) - 1), columns]
+        return out
+
+
+def downsample_minmax(df: pd.DataFrame, max_points: int = CHART_MAX_POINTS) -> pd.DataFrame:
+    # Keep the first/last point plus each bucket's min and max so peaks survive downsampling.
+    # Buckets are sized so the union over all columns stays within max_points rows.
+    n = len(df)
+    if n <= max_points:
+        return df
+    n_buckets = max(1, (max_points - 2) // (2 * df.shape[1]))
+    bucket = int(np.ceil(n / n_buckets))
+    keep = {0, n - 1}
+    for values in df.to_numpy(dtype=np.float64).T:
+        padded = np.pad(values, (0, -n % bucket), constant_values=np.nan)
+        buckets = padded.reshape(-1, bucket)
+        starts = np.arange(len(buckets)) * bucket
+        filled = ~np.isnan(buckets).all(axis=1)
+        keep.update((starts + np.nanargmin(np.where(filled[:, None], buckets, 0.0), axis=1))[filled])
+        keep.update((starts + np.nanargmax(np.where(filled[:, None], buckets, 0.0), axis=1))[filled])
+    rows = sorted(int(i) for i in keep if i < n)
+    if len(rows) > max_points:
+        # Only reachable when max_points is smaller than two points per column
+        rows = [rows[i] for i in np.linspace(0, len(rows) - 1, max_points).astype(int)]
+    return df.iloc[rows]
+
+
+def current_projection_cubes(cubes: dict[str, dict], revision: str, years: int) -> tuple[dict, list[str]]:
+    # Splits cubes into those computed for the current input revision and projection
+    # length, and the names of the stale ones
+    current = {s: cube for s, cube in cubes.items() if cube["key"][0] == revision and cube["key"][2] == years}
+    stale = [s for s in cubes if s not in current]
+    return current, stale
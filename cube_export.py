@@ -0,0 +1,175 @@
+"""Projection cubes as Arrow record batches, Parquet datasets and IPC streams.
+
+pyarrow is only imported once an export is requested, keeping it off the
+app's startup path.
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+# Rows per Arrow record batch when streaming projection cubes
+EXPORT_CHUNK_ROWS = 1_000_000
+
+# Server-side Parquet exports are confined to this folder (one subfolder per session)
+EXPORT_ROOT = "exports"
+
+
+def cube_schema(with_scenario: bool = True):
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("scenario", pa.dictionary(pa.int32(), pa.string())),
+        ("path", pa.int32()),
+        ("line_item", pa.dictionary(pa.int32(), pa.string())),
+        ("year", pa.int32()),
+        ("value", pa.float64()),
+    ])
+    return schema if with_scenario else schema.remove(0)
+
+
+def build_projection_cube(statements: list[list[dict]]) -> dict:
+    # Stack every statement into one (line item x period) float64 buffer
+    years = np.array([row["Year"] for row in statements[0]], dtype=np.int32)
+    line_items = [key for rows in statements for key in rows[0] if key != "Year"]
+    values = np.empty((len(line_items), len(years)), dtype=np.float64)
+    i = 0
+    for rows in statements:
+        keys = [key for key in rows[0] if key != "Year"]
+        values[i:i + len(keys)] = np.array([[row[key] for key in keys] for row in rows], dtype=np.float64).T
+        i += len(keys)
+    return {"line_items": line_items, "years": years, "values": values}
+
+
+def iter_cube_batches(cube: dict, paths: np.ndarray | None = None, scenario: str | None = None,
+                      chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Yields Arrow record batches that wrap slices of the NumPy buffers without copying values.
+    # `paths` holds simulated values shaped (path x line item x period) and is streamed in chunks.
+    import pyarrow as pa
+
+    n_items, n_periods = cube["values"].shape
+    item_dict = pa.array(cube["line_items"], type=pa.string())
+    item_idx = np.repeat(np.arange(n_items, dtype=np.int32), n_periods)
+    years = np.tile(cube["years"], n_items)
+
+    def batch(values: np.ndarray, path_ids: np.ndarray | None = None) -> pa.RecordBatch:
+        reps = len(values) // len(item_idx)
+        columns = {}
+        if scenario is not None:
+            columns["scenario"] = pa.DictionaryArray.from_arrays(
+                np.zeros(len(values), dtype=np.int32), pa.array([scenario])
+            )
+        if path_ids is not None:
+            columns["path"] = pa.array(np.repeat(path_ids, len(item_idx)))
+        columns["line_item"] = pa.DictionaryArray.from_arrays(np.tile(item_idx, reps), item_dict)
+        columns["year"] = pa.array(np.tile(years, reps))
+        columns["value"] = pa.array(values)
+        return pa.RecordBatch.from_pydict(columns)
+
+    if paths is None:
+        yield batch(np.ascontiguousarray(cube["values"]).ravel())
+        return
+
+    # Convert per chunk so a non-float64 or strided path array is never copied as a whole
+    per_chunk = max(1, chunk_rows // len(item_idx))
+    for start in range(0, len(paths), per_chunk):
+        stop = min(start + per_chunk, len(paths))
+        chunk = np.ascontiguousarray(paths[start:stop], dtype=np.float64)
+        yield batch(chunk.ravel(), np.arange(start, stop, dtype=np.int32))
+
+
+def iter_scenario_batches(scenario: str, cube: dict, paths: np.ndarray | None = None,
+                          with_scenario: bool = True, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Deterministic rows first (null path), then simulated paths when present, all cast
+    # to one schema so scenarios can be written to a single stream or dataset
+    import pyarrow as pa
+
+    schema = cube_schema(with_scenario)
+    for source in [None] if paths is None else [None, paths]:
+        for rb in iter_cube_batches(cube, source, scenario if with_scenario else None, chunk_rows):
+            if "path" not in rb.schema.names:
+                rb = rb.add_column(int(with_scenario), "path", pa.nulls(rb.num_rows, pa.int32()))
+            yield rb.cast(schema)
+
+
+def resolve_export_dir(owner: str, folder: str) -> str:
+    # Resolves <EXPORT_ROOT>/<owner>/<folder>, rejecting anything that escapes it. The
+    # folder itself must be a subfolder since a finished export replaces it as a whole.
+    root = os.path.realpath(EXPORT_ROOT)
+    base = os.path.realpath(os.path.join(root, owner))
+    target = os.path.realpath(os.path.join(base, folder))
+    if not base.startswith(root + os.sep) or not target.startswith(base + os.sep):
+        raise ValueError(f"Export folder must be a subfolder of {EXPORT_ROOT}/<session>/")
+    return target
+
+
+# Serializes the final directory swap between exports running in other threads
+_swap_lock = threading.Lock()
+
+
+def write_projection_parquet(root: str, cubes: dict[str, dict], paths: dict[str, np.ndarray] | None = None,
+                             chunk_rows: int = EXPORT_CHUNK_ROWS, on_batch=None, on_scenario=None) -> list[str]:
+    # One hive-style partition per scenario: <root>/scenario=<name>/part-0.parquet
+    import pyarrow.parquet as pq
+
+    # The dataset is written to a staging folder of its own next to `root` and swapped in
+    # once every partition is complete, so concurrent exports never share files and a
+    # failed or cancelled export leaves the previous dataset untouched
+    parent = os.path.dirname(root)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{os.path.basename(root)}-", dir=parent)
+    try:
+        files = []
+        for scenario, cube in cubes.items():
+            folder = f"scenario={scenario}"
+            os.makedirs(os.path.join(staging, folder))
+            with pq.ParquetWriter(os.path.join(staging, folder, "part-0.parquet"), cube_schema(False)) as writer:
+                for rb in iter_scenario_batches(scenario, cube, (paths or {}).get(scenario), False, chunk_rows):
+                    writer.write_batch(rb)
+                    if on_batch is not None:
+                        on_batch(rb.num_rows)
+            files.append(os.path.join(folder, "part-0.parquet"))
+            if on_scenario is not None:
+                on_scenario(scenario)
+
+        with _swap_lock:
+            replaced = None
+            if os.path.exists(root):
+                replaced = staging + ".old"
+                os.rename(root, replaced)
+            try:
+                os.rename(staging, root)
+            except OSError:
+                if replaced is not None:
+                    os.rename(replaced, root)
+                raise
+        if replaced is not None:
+            shutil.rmtree(replaced, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return [os.path.join(root, f) for f in files]
+
+
+def write_projection_ipc(sink, cubes: dict[str, dict], paths: dict[str, np.ndarray] | None = None,
+                         chunk_rows: int = EXPORT_CHUNK_ROWS, on_batch=None, on_scenario=None) -> None:
+    # Single Arrow IPC stream covering every scenario
+    import pyarrow as pa
+
+    with pa.ipc.new_stream(sink, cube_schema()) as writer:
+        for scenario, cube in cubes.items():
+            for rb in iter_scenario_batches(scenario, cube, (paths or {}).get(scenario), True, chunk_rows):
+                writer.write_batch(rb)
+                if on_batch is not None:
+                    on_batch(rb.num_rows)
+            if on_scenario is not None:
+                on_scenario(scenario)
+
+
+def cube_export_rows(cubes: dict[str, dict], paths: dict[str, np.ndarray] | None) -> int:
+    return sum(
+        cube["values"].size * (1 + len((paths or {}).get(scenario, ())))
+        for scenario, cube in cubes.items()
+    )
@@ -0,0 +1,158 @@
+"""Edit history for the model inputs: cell-level diffs with undo/redo."""
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Maximum number of revisions kept in the input edit history
+HISTORY_LIMIT = 50
+
+
+def diff_frames(old: pd.DataFrame, new: pd.DataFrame) -> dict:
+    # Column changes are stored as full before/after frames
+    if list(old.columns) != list(new.columns):
+        return {"old": old, "new": new}
+
+    # Otherwise keep only changed cells plus any added/removed rows
+    n = min(len(old), len(new))
+    a = old.iloc[:n].to_numpy(dtype=object)
+    b = new.iloc[:n].to_numpy(dtype=object)
+    changed = ~((a == b) | (pd.isna(a) & pd.isna(b)))
+    diff = {}
+    cells = [(int(r), int(c), a[r, c], b[r, c]) for r, c in zip(*np.nonzero(changed))]
+    if cells:
+        diff["cells"] = cells
+    if len(old) > n:
+        diff["old_tail"] = old.iloc[n:].copy()
+    if len(new) > n:
+        diff["new_tail"] = new.iloc[n:].copy()
+    return diff
+
+
+def apply_frame_diff(df: pd.DataFrame, diff: dict, forward: bool = True) -> pd.DataFrame:
+    if "old" in diff:
+        return (diff["new"] if forward else diff["old"]).copy()
+
+    drop_tail, add_tail = ("old_tail", "new_tail") if forward else ("new_tail", "old_tail")
+    out = df.iloc[:len(df) - len(diff.get(drop_tail, ()))]
+    if "cells" in diff:
+        values = out.to_numpy(dtype=object, copy=True)
+        for r, c, old_value, new_value in diff["cells"]:
+            values[r, c] = new_value if forward else old_value
+        out = pd.DataFrame(values, index=out.index, columns=out.columns).infer_objects()
+    if add_tail in diff:
+        out = pd.concat([out, diff[add_tail]])
+    return out.copy()
+
+
+def snapshot_digest(snapshot: dict[str, pd.DataFrame]) -> str:
+    digest = hashlib.sha1()
+    for name, df in snapshot.items():
+        digest.update(name.encode())
+        digest.update(repr(list(df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class InputHistory:
+    """Edit history of the model inputs stored as cell-level diffs.
+
+    Only the oldest retained snapshot (``base``) and the current one are kept
+    in full; every revision in between is a reversible diff. Once more than
+    ``limit`` diffs accumulate the oldest ones are folded into ``base``.
+    """
+
+    def __init__(self, snapshot: dict[str, pd.DataFrame], limit: int = HISTORY_LIMIT):
+        self.limit = limit
+        self.base = snapshot
+        self.current = snapshot
+        self.diffs = []
+        self.revisions = [self._revision(0, "Initial inputs", snapshot)]
+        self.cursor = 0
+        self.next_id = 1
+
+    @staticmethod
+    def _revision(rev_id: int, label: str, snapshot: dict) -> dict:
+        return {
+            "id": rev_id,
+            "label": label,
+            "time": datetime.now().strftime("%H:%M:%S"),
+            "digest": snapshot_digest(snapshot),
+        }
+
+    @staticmethod
+    def _describe(diff: dict) -> str:
+        parts = []
+        for name, table_diff in diff.items():
+            if "old" in table_diff:
+                parts.append(f"{name}: columns")
+                continue
+            cells = len(table_diff.get("cells", ()))
+            rows = len(table_diff.get("new_tail", ())) - len(table_diff.get("old_tail", ()))
+            detail = f"{cells} cell{'s' if cells != 1 else ''}" if cells else ""
+            if rows:
+                detail += f"{', ' if detail else ''}{rows:+d} rows"
+            parts.append(f"{name}: {detail or 'rows'}")
+        return "; ".join(parts)
+
+    @staticmethod
+    def _apply(snapshot: dict, diff: dict, forward: bool) -> dict:
+        out = dict(snapshot)
+        for name, table_diff in diff.items():
+            out[name] = apply_frame_diff(snapshot[name], table_diff, forward)
+        return out
+
+    @property
+    def current_revision(self) -> dict:
+        return self.revisions[self.cursor]
+
+    def can_undo(self) -> bool:
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        return self.cursor < len(self.diffs)
+
+    def record(self, snapshot: dict[str, pd.DataFrame]) -> bool:
+        diff = {}
+        for name, df in snapshot.items():
+            previous = self.current.get(name)
+            if previous is None:
+                table_diff = {"old": df.iloc[0:0], "new": df}
+            else:
+                table_diff = diff_frames(previous, df)
+            if table_diff:
+                diff[name] = table_diff
+        if not diff:
+            return False
+
+        # A new edit discards any revisions that were undone
+        del self.diffs[self.cursor:]
+        del self.revisions[self.cursor + 1:]
+        self.diffs.append(diff)
+        self.current = snapshot
+        self.revisions.append(self._revision(self.next_id, self._describe(diff), snapshot))
+        self.next_id += 1
+        self.cursor += 1
+
+        while len(self.diffs) > self.limit:
+            self.base = self._apply(self.base, self.diffs.pop(0), True)
+            self.revisions.pop(0)
+            self.cursor -= 1
+        return True
+
+    def jump(self, rev_id: int) -> dict[str, pd.DataFrame]:
+        target = next(i for i, rev in enumerate(self.revisions) if rev["id"] == rev_id)
+        while self.cursor > target:
+            self.cursor -= 1
+            self.current = self._apply(self.current, self.diffs[self.cursor], False)
+        while self.cursor < target:
+            self.current = self._apply(self.current, self.diffs[self.cursor], True)
+            self.cursor += 1
+        return self.current
+
+    def undo(self) -> dict[str, pd.DataFrame]:
+        return self.jump(self.revisions[max(self.cursor - 1, 0)]["id"])
+
+    def redo(self) -> dict[str, pd.DataFrame]:
+        return self.jump(self.revisions[min(self.cursor + 1, len(self.diffs))]["id"])
@@ -0,0 +1,218 @@
+"""Process-wide background job runner with progress, cancellation and deduplication."""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Worker threads per process, active jobs per user and in total, and seconds
+# finished jobs are kept
+JOB_WORKERS = 4
+JOB_LIMIT_PER_USER = 2
+JOB_QUEUE_LIMIT = 16
+JOB_TTL_SECONDS = 3600
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLimitError(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, label: str, input_hash: str, download: tuple | None = None):
+        self.id = job_id
+        self.label = label
+        self.input_hash = input_hash
+        self.download = download  # (file_name, mime) when the result is a file to download
+        self.owners = {}  # owner id -> client key the job counts against
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self.files = []  # temporary output files, removed when the job is pruned
+        self.cancel_event = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def report(self, progress: float, message: str = "", partial=None) -> None:
+        # Called from the job function; also the point where cancellation takes effect
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def temp_file(self, suffix: str) -> str:
+        # Large outputs go to disk instead of being held in memory as job results
+        fd, path = tempfile.mkstemp(prefix=f"model-job-{self.id}-", suffix=suffix)
+        os.close(fd)
+        self.files.append(path)
+        return path
+
+    def remove_files(self) -> None:
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.files = []
+
+    def batch_progress(self, total_rows: int):
+        # Callback for the cube writers' on_batch hook
+        done = 0
+
+        def on_batch(rows: int) -> None:
+            nonlocal done
+            done += rows
+            self.report(done / max(total_rows, 1), f"{done:,} of {total_rows:,} rows")
+
+        return on_batch
+
+    def scenario_progress(self, total: int):
+        # Callback for the cube writers' on_scenario hook; the finished scenarios are the
+        # job's partial result while it runs
+        done = []
+
+        def on_scenario(scenario: str) -> None:
+            done.append(scenario)
+            self.report(self.progress, self.message, partial=f"{len(done)} of {total} scenario(s) written: {', '.join(done)}")
+
+        return on_scenario
+
+
+def job_input_hash(*parts) -> str:
+    digest = hashlib.sha1()
+
+    def feed(obj) -> None:
+        if isinstance(obj, pd.DataFrame):
+            digest.update(repr(list(obj.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(obj).values.tobytes())
+        elif isinstance(obj, np.ndarray):
+            digest.update(f"{obj.dtype}{obj.shape}".encode())
+            digest.update(np.ascontiguousarray(obj).data)
+        elif isinstance(obj, dict):
+            for key in obj:
+                feed(key)
+                feed(obj[key])
+        elif isinstance(obj, (list, tuple)):
+            for item in obj:
+                feed(item)
+        else:
+            digest.update(repr(obj).encode())
+
+    for part in parts:
+        feed(part)
+    return digest.hexdigest()
+
+
+class JobRunner:
+    """Process-wide worker pool for long-running work.
+
+    Identical submissions (same function and input hash) share one job. Each
+    client may have at most ``per_user_limit`` queued or running jobs and the
+    whole process at most ``queue_limit``. Finished jobs are kept for ``ttl``
+    seconds so they survive a page reload.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, per_user_limit: int = JOB_LIMIT_PER_USER,
+                 queue_limit: int = JOB_QUEUE_LIMIT, ttl: float = JOB_TTL_SECONDS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-job")
+        self.per_user_limit = per_user_limit
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.by_hash = {}
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job in [j for j in self.jobs.values() if j.finished is not None and j.finished < cutoff]:
+            job.remove_files()
+            del self.jobs[job.id]
+            if self.by_hash.get(job.input_hash) is job:
+                del self.by_hash[job.input_hash]
+
+    def _run(self, job: Job, fn, args: tuple) -> None:
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            job.finished = time.time()
+            return
+        job.status = "running"
+        try:
+            job.result = fn(job, *args)
+            job.progress = 1.0
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as exc:
+            job.status = "failed"
+            job.error = f"{type(exc).__name__}: {exc}"
+        finally:
+            job.finished = time.time()
+            if job.status != "done":
+                job.remove_files()
+                with self.lock:
+                    if self.by_hash.get(job.input_hash) is job:
+                        del self.by_hash[job.input_hash]
+
+    def submit(self, owner: str, client: str, label: str, fn, *args, download: tuple | None = None) -> Job:
+        # `owner` decides who sees the job, `client` which per-user limit it counts against
+        input_hash = job_input_hash(fn.__name__, args)
+        with self.lock:
+            self._prune()
+            job = self.by_hash.get(input_hash)
+            if job is not None:
+                job.owners.setdefault(owner, client)
+                return job
+
+            active_jobs = [j for j in self.jobs.values() if j.active]
+            if len(active_jobs) >= self.queue_limit:
+                raise JobLimitError("The background job queue is full; try again once some jobs finish.")
+            active = sum(1 for j in active_jobs if client in j.owners.values())
+            if active >= self.per_user_limit:
+                raise JobLimitError(
+                    f"You already have {active} background job(s) running; "
+                    "wait for one to finish or cancel it."
+                )
+            job = Job(uuid.uuid4().hex[:8], label, input_hash, download)
+            job.owners[owner] = client
+            self.jobs[job.id] = job
+            self.by_hash[input_hash] = job
+            job.future = self.executor.submit(self._run, job, fn, args)
+        return job
+
+    def cancel(self, owner: str, job_id: str) -> None:
+        # A job shared through deduplication keeps running until its last owner cancels
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or owner not in job.owners or not job.active:
+                return
+            del job.owners[owner]
+            if job.owners:
+                return
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                job.status = "cancelled"
+                job.finished = time.time()
+                if self.by_hash.get(job.input_hash) is job:
+                    del self.by_hash[job.input_hash]
+
+    def jobs_for(self, owner: str) -> list[Job]:
+        with self.lock:
+            self._prune()
+            jobs = [j for j in self.jobs.values() if owner in j.owners]
+        return sorted(jobs, key=lambda j: j.created, reverse=True)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app():
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def sidebar_button(at, label):
+    return next(b for b in at.sidebar.button if b.label == label)
+
+
+def test_undo_of_years_change_restores_slider(app):
+    app.sidebar.slider(key="years").set_value(7).run()
+    history = app.session_state["input_history"]
+    assert len(history.revisions) == 2
+
+    sidebar_button(app, "Undo").click().run()
+    assert not app.exception
+    assert app.session_state["years"] == 5
+    assert app.sidebar.slider(key="years").value == 5
+    history = app.session_state["input_history"]
+    assert [rev["id"] for rev in history.revisions] == [0, 1]
+    assert history.cursor == 0 and history.can_redo()
+
+    sidebar_button(app, "Redo").click().run()
+    assert app.session_state["years"] == 7
+    assert len(app.session_state["input_history"].revisions) == 2
+
+
+def test_undo_restores_assumption_widget(app):
+    key = "Revenue Growth (%)_Base_1"
+    app.session_state["expander_Revenue Growth (%)"] = True
+    app.run()
+    app.number_input(key=key).set_value(25.0).run()
+    sidebar_button(app, "Undo").click().run()
+    assert app.number_input(key=key).value == 10.0
+    assert app.session_state["input_history"].can_redo()
+
+
+def test_small_excel_export_downloads_directly(app):
+    assert [d.label for d in app.get("download_button")] == ["Download Projections to Excel"]
+    assert not [b for b in app.button if b.label == "Download Projections to Excel"]
+
+
+def test_assumption_widgets_are_built_only_for_open_expanders(app):
+    assert not [n for n in app.number_input if n.key and n.key.startswith("COGS")]
+    app.session_state["expander_COGS (% of Revenue)"] = True
+    app.run()
+    # Only the first-year input per scenario while "same every year" is on
+    assert len([n for n in app.number_input if n.key and n.key.startswith("COGS")]) == 3
+
+
+def test_charts_render_from_vega_lite_spec(app):
+    charts = app.get("vega_lite_chart")
+    assert len(charts) == 1
+    assert '"Series"' in charts[0].proto.spec
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_data import PercentileBands, current_projection_cubes, downsample_minmax
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def empirical_rank(values, estimate):
+    # Fraction of values at or below each period's estimate
+    return (values <= estimate).mean(axis=0)
+
+
+def test_bands_are_empty_without_paths():
+    bands = PercentileBands()
+    bands.update(np.empty((0, 4)))
+    assert bands.bands() == {}
+
+
+def test_bands_match_numpy_below_capacity():
+    paths = np.random.default_rng(1).normal(size=(1000, 6))
+    bands = PercentileBands(capacity=4096, percentiles=PERCENTILES)
+    for start in range(0, len(paths), 128):
+        bands.update(paths[start:start + 128])
+
+    out = bands.bands()
+    assert list(out) == [f"P{p}" for p in PERCENTILES]
+    for p in PERCENTILES:
+        expected = np.percentile(paths, p, axis=0, method="inverted_cdf")
+        np.testing.assert_allclose(out[f"P{p}"], expected)
+
+
+@pytest.mark.parametrize("chunk", [1000, 7777])
+def test_bands_stay_close_to_numpy_beyond_capacity(chunk):
+    rng = np.random.default_rng(2)
+    paths = np.column_stack([rng.normal(size=100_000), rng.exponential(size=100_000), rng.uniform(size=100_000)])
+    bands = PercentileBands(capacity=1024, percentiles=PERCENTILES)
+    for start in range(0, len(paths), chunk):
+        bands.update(paths[start:start + chunk])
+
+    assert bands.count == len(paths)
+    # Memory stays bounded by capacity per level
+    assert all(len(level) <= 1024 for level in bands.levels)
+    out = bands.bands()
+    for p in PERCENTILES:
+        ranks = empirical_rank(paths, out[f"P{p}"])
+        np.testing.assert_allclose(ranks, p / 100.0, atol=0.01)
+
+
+def test_downsample_keeps_small_frames():
+    df = pd.DataFrame({"a": np.arange(10.0)})
+    assert downsample_minmax(df, max_points=10) is df
+
+
+@pytest.mark.parametrize("rows,columns,max_points", [(10_000, 1, 500), (10_000, 5, 500), (3_001, 7, 50), (1_000, 30, 20)])
+def test_downsample_bounds_rows_and_keeps_extremes(rows, columns, max_points):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.normal(size=(rows, columns)).cumsum(axis=0), columns=[f"c{i}" for i in range(columns)])
+    out = downsample_minmax(df, max_points=max_points)
+
+    assert len(out) <= max_points
+    assert out.index.is_monotonic_increasing
+    if max_points >= 2 * columns + 2:
+        assert out.index[0] == 0 and out.index[-1] == rows - 1
+        for column in df:
+            assert out[column].max() == df[column].max()
+            assert out[column].min() == df[column].min()
+
+
+def test_downsample_ignores_missing_values():
+    values = np.full(2_000, np.nan)
+    values[1_500] = 9.0
+    values[1_700] = -9.0
+    out = downsample_minmax(pd.DataFrame({"a": values}), max_points=20)
+    assert len(out) <= 20
+    assert out["a"].max() == 9.0 and out["a"].min() == -9.0
+
+
+def test_current_projection_cubes_splits_stale_scenarios():
+    cubes = {
+        "Base": {"key": ("rev2", "Base", 5)},
+        "Optimistic": {"key": ("rev1", "Optimistic", 5)},
+        "Worst": {"key": ("rev2", "Worst", 7)},
+    }
+    current, stale = current_projection_cubes(cubes, "rev2", 5)
+    assert list(current) == ["Base"]
+    assert stale == ["Optimistic", "Worst"]
@@ -0,0 +1,122 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from cube_export import (
+    build_projection_cube, cube_export_rows, resolve_export_dir, write_projection_ipc, write_projection_parquet
+)
+
+
+def make_cube(offset=0.0):
+    statements = [
+        [{"Year": 2025 + i, "Ingresos": 100.0 * (i + 1) + offset, "EBIT": 10.0 * i} for i in range(4)],
+        [{"Year": 2025 + i, "Net Cash Flow": -5.0 * i} for i in range(4)],
+    ]
+    return build_projection_cube(statements)
+
+
+def read_dataset(root):
+    df = ds.dataset(root, partitioning="hive").to_table().to_pandas().astype({"scenario": str, "line_item": str})
+    return df.sort_values(["scenario", "path", "line_item", "year"]).reset_index(drop=True)
+
+
+def test_build_projection_cube_stacks_statements():
+    cube = make_cube()
+    assert cube["line_items"] == ["Ingresos", "EBIT", "Net Cash Flow"]
+    assert cube["years"].tolist() == [2025, 2026, 2027, 2028]
+    assert cube["values"].shape == (3, 4)
+    assert cube["values"][2].tolist() == [0.0, -5.0, -10.0, -15.0]
+
+
+def test_parquet_export_streams_paths_in_chunks(tmp_path):
+    cube = make_cube()
+    # Non-contiguous float32 paths, converted chunk by chunk
+    paths = np.random.default_rng(0).normal(size=(20, 3, 8)).astype(np.float32)[:, :, ::2]
+    root = str(tmp_path / "projections")
+    batches = []
+
+    written = write_projection_parquet(root, {"Base": cube}, {"Base": paths}, chunk_rows=24, on_batch=batches.append)
+
+    assert written == [os.path.join(root, "scenario=Base", "part-0.parquet")]
+    assert sum(batches) == cube_export_rows({"Base": cube}, {"Base": paths}) == 12 * 21
+    assert max(batches) <= 24 and len(batches) > 2
+
+    table = ds.dataset(root, partitioning="hive").to_table().to_pandas()
+    deterministic = table[table["path"].isna()]
+    assert sorted(deterministic["value"]) == sorted(cube["values"].ravel())
+    simulated = table.dropna(subset=["path"])
+    for (path, item, year), value in simulated.set_index(["path", "line_item", "year"])["value"].items():
+        i = cube["line_items"].index(item)
+        j = cube["years"].tolist().index(year)
+        assert value == pytest.approx(float(paths[int(path), i, j]))
+
+
+def test_ipc_export_covers_every_scenario():
+    cubes = {"Base": make_cube(), "Worst": make_cube(-50.0)}
+    paths = {"Worst": np.ones((3, 3, 4))}
+    sink = io.BytesIO()
+    write_projection_ipc(sink, cubes, paths, chunk_rows=12)
+
+    table = pa.ipc.open_stream(sink.getvalue()).read_all()
+    assert table.num_rows == cube_export_rows(cubes, paths) == 12 + 12 * 4
+    assert table.column("scenario").to_pandas().value_counts().to_dict() == {"Base": 12, "Worst": 48}
+
+
+def test_failed_export_keeps_previous_dataset(tmp_path):
+    root = str(tmp_path / "projections")
+    write_projection_parquet(root, {"Base": make_cube(), "Worst": make_cube(-50.0)})
+    before = read_dataset(root)
+
+    def fail_on_second_scenario(rows, seen=[]):
+        seen.append(rows)
+        if len(seen) == 2:
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        write_projection_parquet(root, {"Base": make_cube(1.0), "Worst": make_cube(2.0)},
+                                 on_batch=fail_on_second_scenario)
+
+    pd.testing.assert_frame_equal(read_dataset(root), before)
+    assert os.listdir(tmp_path) == ["projections"]
+
+
+def test_concurrent_exports_to_one_folder_do_not_collide(tmp_path):
+    root = str(tmp_path / "projections")
+    start = threading.Barrier(4)
+    errors = []
+
+    def export(offset):
+        try:
+            start.wait()
+            paths = {"Base": np.full((200, 3, 4), offset)}
+            write_projection_parquet(root, {"Base": make_cube(offset)}, paths, chunk_rows=12)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=export, args=(float(i),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ["projections"]
+    # The dataset is one export's complete output, not a mix
+    values = read_dataset(root)
+    simulated = values.dropna(subset=["path"])["value"]
+    assert len(values) == 12 * 201 and simulated.nunique() == 1
+
+
+def test_resolve_export_dir_confines_exports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    target = resolve_export_dir("session", "runs/projections")
+    assert target == os.path.join(os.path.realpath(tmp_path), "exports", "session", "runs", "projections")
+    for folder in ["../other", "../../etc", "/tmp", ".", ""]:
+        with pytest.raises(ValueError):
+            resolve_export_dir("session", folder)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from history import InputHistory, apply_frame_diff, diff_frames
+
+
+def frame(values, columns=("Year", "Amount")):
+    return pd.DataFrame(values, columns=list(columns))
+
+
+def assert_round_trip(old, new):
+    diff = diff_frames(old, new)
+    pd.testing.assert_frame_equal(apply_frame_diff(old, diff, forward=True), new, check_dtype=False)
+    pd.testing.assert_frame_equal(apply_frame_diff(new, diff, forward=False), old, check_dtype=False)
+    return diff
+
+
+def test_unchanged_frames_have_empty_diff():
+    df = frame([[2024, 1.0], [2025, np.nan]])
+    assert diff_frames(df, df.copy()) == {}
+
+
+def test_cell_changes_round_trip():
+    old = frame([[2024, 1.0], [2025, 2.0], [2026, 3.0]])
+    new = frame([[2024, 1.0], [2025, 5.0], [2026, 3.0]])
+    diff = assert_round_trip(old, new)
+    assert diff == {"cells": [(1, 1, 2.0, 5.0)]}
+
+
+def test_added_rows_round_trip():
+    old = frame([[2024, 1.0]])
+    new = frame([[2024, 1.5], [2025, 2.0], [2026, 3.0]])
+    diff = assert_round_trip(old, new)
+    assert len(diff["new_tail"]) == 2 and "old_tail" not in diff
+
+
+def test_deleted_rows_round_trip():
+    old = frame([[2024, 1.0], [2025, 2.0], [2026, 3.0]])
+    new = frame([[2024, 1.0]])
+    diff = assert_round_trip(old, new)
+    assert len(diff["old_tail"]) == 2 and "cells" not in diff
+
+
+def test_column_change_stores_whole_frames():
+    old = frame([[2024, 1.0]])
+    new = pd.DataFrame({"Year": [2024], "Amount": [1.0], "Rate": [0.1]})
+    diff = assert_round_trip(old, new)
+    assert set(diff) == {"old", "new"}
+
+
+def snapshots(n):
+    # Revision i sets the single amount to i and keeps i + 1 rows
+    return [{"Inputs": frame([[2024 + r, float(i)] for r in range(i + 1)])} for i in range(n)]
+
+
+def test_undo_redo_and_jump_restore_each_revision():
+    states = snapshots(4)
+    history = InputHistory(states[0])
+    for state in states[1:]:
+        assert history.record(state)
+    assert [rev["id"] for rev in history.revisions] == [0, 1, 2, 3]
+
+    pd.testing.assert_frame_equal(history.undo()["Inputs"], states[2]["Inputs"], check_dtype=False)
+    pd.testing.assert_frame_equal(history.undo()["Inputs"], states[1]["Inputs"], check_dtype=False)
+    pd.testing.assert_frame_equal(history.redo()["Inputs"], states[2]["Inputs"], check_dtype=False)
+    pd.testing.assert_frame_equal(history.jump(0)["Inputs"], states[0]["Inputs"], check_dtype=False)
+    pd.testing.assert_frame_equal(history.jump(3)["Inputs"], states[3]["Inputs"], check_dtype=False)
+    assert not history.can_redo()
+
+
+def test_recording_the_restored_state_keeps_redo_branch():
+    states = snapshots(3)
+    history = InputHistory(states[0])
+    history.record(states[1])
+    history.record(states[2])
+
+    restored = history.undo()
+    assert not history.record({name: df.copy() for name, df in restored.items()})
+    assert history.can_redo() and len(history.revisions) == 3
+
+
+def test_new_edit_discards_undone_revisions():
+    states = snapshots(3)
+    history = InputHistory(states[0])
+    history.record(states[1])
+    history.undo()
+    history.record(states[2])
+    assert [rev["id"] for rev in history.revisions] == [0, 2]
+    assert not history.can_redo()
+
+
+@pytest.mark.parametrize("limit", [1, 3])
+def test_compaction_folds_oldest_diffs_into_base(limit):
+    states = snapshots(6)
+    history = InputHistory(states[0], limit=limit)
+    for state in states[1:]:
+        history.record(state)
+
+    assert len(history.diffs) == limit
+    assert [rev["id"] for rev in history.revisions] == list(range(5 - limit, 6))
+    pd.testing.assert_frame_equal(history.base["Inputs"], states[5 - limit]["Inputs"], check_dtype=False)
+    oldest = history.jump(history.revisions[0]["id"])
+    pd.testing.assert_frame_equal(oldest["Inputs"], states[5 - limit]["Inputs"], check_dtype=False)
+    assert not history.can_undo()
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from jobs import Job, JobCancelled, JobLimitError, JobRunner, job_input_hash
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def blocking(job, release, value):
+    # Runs until `release` is set, checking for cancellation like a real job would
+    while not release.wait(0.01):
+        job.report(0.5, "working")
+    return value
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(workers=2, per_user_limit=2, queue_limit=3, ttl=60)
+    yield runner
+    runner.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_input_hash_covers_frames_and_arrays():
+    df = pd.DataFrame({"a": [1.0, 2.0]})
+    assert job_input_hash("fn", df) == job_input_hash("fn", df.copy())
+    assert job_input_hash("fn", df) != job_input_hash("fn", df.assign(a=[1.0, 3.0]))
+    assert job_input_hash("fn", {"A": np.zeros(3)}) != job_input_hash("fn", {"A": np.zeros(4)})
+
+
+def test_identical_submissions_share_one_job(runner):
+    release = threading.Event()
+    first = runner.submit("tab1", "session:tab1", "Export", blocking, release, 1)
+    second = runner.submit("tab2", "session:tab2", "Export", blocking, release, 1)
+    other = runner.submit("tab2", "session:tab2", "Export", blocking, release, 2)
+
+    assert first is second and other is not first
+    assert set(first.owners) == {"tab1", "tab2"}
+    assert [job.id for job in runner.jobs_for("tab1")] == [first.id]
+    release.set()
+    wait_for(lambda: first.status == other.status == "done")
+    assert (first.result, other.result) == (1, 2)
+
+
+def test_shared_job_runs_until_last_owner_cancels(runner):
+    release = threading.Event()
+    job = runner.submit("tab1", "session:tab1", "Export", blocking, release, 1)
+    runner.submit("tab2", "session:tab2", "Export", blocking, release, 1)
+    wait_for(lambda: job.status == "running")
+
+    runner.cancel("tab1", job.id)
+    time.sleep(0.05)
+    assert job.status == "running" and list(job.owners) == ["tab2"]
+    assert runner.jobs_for("tab1") == []
+
+    runner.cancel("tab2", job.id)
+    wait_for(lambda: job.status == "cancelled")
+    # A cancelled job no longer deduplicates, so resubmitting starts a fresh one
+    assert runner.submit("tab1", "session:tab1", "Export", blocking, release, 1) is not job
+    release.set()
+
+
+def test_cancel_ignores_other_owners_and_finished_jobs(runner):
+    release = threading.Event()
+    release.set()
+    job = runner.submit("tab1", "session:tab1", "Export", blocking, release, 1)
+    wait_for(lambda: job.status == "done")
+    runner.cancel("tab1", job.id)
+    runner.cancel("stranger", job.id)
+    assert job.status == "done" and list(job.owners) == ["tab1"]
+
+
+def test_queued_job_is_cancelled_before_it_starts():
+    runner = JobRunner(workers=1, per_user_limit=5, queue_limit=5)
+    release = threading.Event()
+    running = runner.submit("tab", "session:tab", "First", blocking, release, 1)
+    queued = runner.submit("tab", "session:tab", "Second", blocking, release, 2)
+    wait_for(lambda: running.status == "running")
+    assert queued.status == "queued"
+
+    runner.cancel("tab", queued.id)
+    assert queued.status == "cancelled"
+    release.set()
+    wait_for(lambda: running.status == "done")
+    runner.executor.shutdown()
+
+
+def test_per_client_and_global_limits(runner):
+    release = threading.Event()
+    runner.submit("tab1", "session:a", "Export", blocking, release, 1)
+    runner.submit("tab2", "session:a", "Export", blocking, release, 2)
+    with pytest.raises(JobLimitError, match="already have 2"):
+        runner.submit("tab3", "session:a", "Export", blocking, release, 3)
+
+    runner.submit("tab4", "session:b", "Export", blocking, release, 4)
+    with pytest.raises(JobLimitError, match="queue is full"):
+        runner.submit("tab5", "session:c", "Export", blocking, release, 5)
+    # Joining an existing job is always allowed
+    runner.submit("tab5", "session:c", "Export", blocking, release, 1)
+    release.set()
+
+
+def test_failed_job_reports_error_and_removes_files(runner):
+    paths = []
+
+    def failing(job):
+        paths.append(job.temp_file(".tmp"))
+        raise ValueError("boom")
+
+    job = runner.submit("tab", "session:tab", "Export", failing)
+    wait_for(lambda: job.status == "failed")
+    assert job.error == "ValueError: boom"
+    assert not os.path.exists(paths[0])
+
+
+def test_finished_jobs_are_pruned_after_ttl():
+    runner = JobRunner(workers=1, ttl=0.05)
+    paths = []
+
+    def write_file(job):
+        paths.append(job.temp_file(".tmp"))
+        return paths[-1]
+
+    job = runner.submit("tab", "session:tab", "Export", write_file)
+    wait_for(lambda: job.status == "done")
+    assert os.path.exists(paths[0])
+    time.sleep(0.1)
+    assert runner.jobs_for("tab") == []
+    assert not os.path.exists(paths[0])
+    runner.executor.shutdown()
+
+
+def test_progress_callbacks_report_rows_and_partial_results():
+    job = Job("j1", "Export", "hash")
+    on_batch = job.batch_progress(200)
+    on_scenario = job.scenario_progress(2)
+    on_batch(50)
+    on_scenario("Base")
+    assert job.progress == 0.25 and job.message == "50 of 200 rows"
+    assert job.partial == "1 of 2 scenario(s) written: Base"
+
+    job.cancel_event.set()
+    with pytest.raises(JobCancelled):
+        on_batch(50)